@@ -1,48 +1,403 @@
+import time
 import streamlit as st 
 import pandas as pd 
 import numpy as np
 import plotly.express as px
 
-def load_data():
-    df = pd.read_csv("dashboard_flights_data.csv")
+# Filtered frames are copied lazily (only when a column is modified), so charts don't need explicit copies
+pd.set_option("mode.copy_on_write", True)
+
+# CSV file, or Parquet dataset directory written by export_parquet in flights_etl.ipynb
+DATA_SOURCE = "dashboard_flights_data.csv"
+
+# "pandas" aggregates an in-memory cube of the data; "duckdb" runs each chart's aggregation as a query over DATA_SOURCE
+QUERY_ENGINE = "pandas"
+
+# Airport reference data (IATA code, country, ...) shipped with the ETL
+AIRPORTS_CSV = "airports.csv"
+
+# Columns used by the dashboard and their types
+DASHBOARD_SCHEMA = {
+    "flight_date": "datetime",
+    "scheduled_departure_datetime": "datetime",
+    "airline": "category",
+    "flight_status": "category",
+    "dep_iata": "category",
+    "dep_airport": "category",
+    "arr_iata": "category",
+    "arr_airport": "category",
+    "arr_country": "category",
+    "dep_delay": "float64",
+    "arr_latitude": "float64",
+    "arr_longitude": "float64",
+}
+
+def apply_schema(flights_df: pd.DataFrame):
+    """ 
+    Cast the dashboard columns to the types declared in DASHBOARD_SCHEMA
+    Parameter:
+        flights_df: flights dataframe
+    Return: flights dataframe with typed columns
+    """
+    for col, dtype in DASHBOARD_SCHEMA.items():
+        if dtype == "datetime":
+            flights_df[col] = pd.to_datetime(flights_df[col].astype(str), errors="coerce")
+        else:
+            flights_df[col] = flights_df[col].astype(dtype)
+    return flights_df
+
+@st.cache_data(show_spinner="Loading flight data...")
+def read_flights(source: str, source_mtime: float, filters: list = None):
+    """ 
+    Read the dashboard columns from a CSV file or Parquet dataset. CSV sources are also saved as a Feather sidecar 
+    (e.g. dashboard_flights_data.feather) that is reused until the CSV is modified. Cached by Streamlit per source and modified time.
+    Parameters:
+        source: path of the CSV file or Parquet dataset directory
+        source_mtime: modified time of the source, used to invalidate the cache
+        filters: Parquet partition/row filters, e.g. [("dep_iata", "in", ["ATL", "JFK"])] (ignored for CSV)
+    Return: flights dataframe
+    """
+    import os
+
+    columns = list(DASHBOARD_SCHEMA)
+
+    if os.path.isdir(source) or source.endswith(".parquet"):
+        return apply_schema(pd.read_parquet(source, columns=columns, filters=filters))
+
+    sidecar = os.path.splitext(source)[0] + ".feather"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= source_mtime:
+        return pd.read_feather(sidecar)
+
+    csv_dtypes = {col: dtype for col, dtype in DASHBOARD_SCHEMA.items() if dtype != "datetime"}
+    df = apply_schema(pd.read_csv(source, usecols=columns, dtype=csv_dtypes))
+
+    try:
+        df.to_feather(sidecar)
+    except OSError:
+        pass
+
     return df
 
+def get_source_mtime(source: str):
+    """ 
+    Get the modified time of a CSV file, or the latest modified time of any file in a Parquet dataset directory
+    Parameter:
+        source: path of the CSV file or Parquet dataset directory
+    Return: modified time in seconds since the epoch
+    """
+    import os
+
+    if os.path.isdir(source):
+        return max((os.path.getmtime(os.path.join(root, f)) for root, _, files in os.walk(source) for f in files), default=0)
+    return os.path.getmtime(source)
+
+def load_data(source: str = DATA_SOURCE, filters: list = None):
+    """ 
+    Load the flights data from a CSV file or a partitioned Parquet dataset
+    Parameters:
+        source: path of the CSV file or Parquet dataset directory
+        filters: Parquet partition/row filters (ignored for CSV)
+    Return: flights dataframe
+    """
+    return read_flights(source, get_source_mtime(source), filters)
+
+# Flights that never operated normally; left out of the delay charts
+EXCLUDED_STATUS = ("cancelled", "diverted")
+
+# Delay bins used by the cube and the delay heatmap
+DELAY_BINS = [-float("inf"), 0, 15, 30, 60, 120, float("inf")]
+DELAY_LABELS = ["Early/On time", "0–15 min", "15–30 min", "30–60 min", "1–2 hrs", "2+ hrs"]
+
+# Dimensions of the aggregate cube; the measures are additive, so any roll-up is a groupby sum
+CUBE_DIMENSIONS = ["flight_date", "airline", "flight_status", "dep_iata", "dep_airport", "arr_iata", "arr_airport", 
+                   "arr_country", "arr_latitude", "arr_longitude", "hour", "delay_bin"]
+CUBE_MEASURES = ["flight_count", "dep_delay_sum", "dep_delay_count", "ontime_count", "delayed_15_count", "delayed_60_count"]
+
+def build_cube(flights_df: pd.DataFrame):
+    """ 
+    Pre-aggregate the flights into additive counts and sums for every combination of CUBE_DIMENSIONS
+    Parameter:
+        flights_df: flights dataframe
+    Return: 
+        Cube dataframe with one row per dimension combination and the measures flight_count, dep_delay_sum, dep_delay_count, 
+        ontime_count (delay < 15 min), delayed_15_count (delay > 15 min) and delayed_60_count (delay > 60 min)
+    """
+    flights_copy = flights_df.copy(deep=False)
+    flights_copy["hour"] = flights_copy["scheduled_departure_datetime"].dt.hour
+    flights_copy["delay_bin"] = pd.cut(flights_copy["dep_delay"], bins=DELAY_BINS, labels=DELAY_LABELS, right=True)
+
+    dep_delay = flights_copy["dep_delay"]
+    flights_copy["dep_delay_count"] = dep_delay.notna().astype(int)
+    flights_copy["ontime_count"] = (dep_delay < 15).astype(int)
+    flights_copy["delayed_15_count"] = (dep_delay > 15).astype(int)
+    flights_copy["delayed_60_count"] = (dep_delay > 60).astype(int)
+
+    # Keep rows with missing dimension values so the counts still add up to the row count
+    cube_df = flights_copy.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False).agg(
+        flight_count=("dep_delay_count", "size"),
+        dep_delay_sum=("dep_delay", "sum"),
+        dep_delay_count=("dep_delay_count", "sum"),
+        ontime_count=("ontime_count", "sum"),
+        delayed_15_count=("delayed_15_count", "sum"),
+        delayed_60_count=("delayed_60_count", "sum")
+    ).reset_index()
+
+    return cube_df.sort_values("flight_date", kind="stable", ignore_index=True)
+
+@st.cache_data(show_spinner="Building aggregates...")
+def read_cube(source: str, source_mtime: float, filters: list = None):
+    """ 
+    Build the aggregate cube for a source. Cached by Streamlit per source and modified time.
+    Parameters:
+        source: path of the CSV file or Parquet dataset directory
+        source_mtime: modified time of the source, used to invalidate the cache
+        filters: Parquet partition/row filters (ignored for CSV)
+    Return: cube dataframe
+    """
+    return build_cube(read_flights(source, source_mtime, filters))
+
+def load_cube(source: str = DATA_SOURCE, filters: list = None):
+    """ 
+    Load the aggregate cube of the flights data
+    Parameters:
+        source: path of the CSV file or Parquet dataset directory
+        filters: Parquet partition/row filters (ignored for CSV)
+    Return: cube dataframe
+    """
+    return read_cube(source, get_source_mtime(source), filters)
+
 def select_date(flights_df: pd.DataFrame, start_date, end_date):
     """ 
     Filter data based on date or date range
     Parameter: 
-        flights_df: flights dataframe
+        flights_df: flights dataframe or cube, sorted by flight_date (see build_cube)
+        start_date: first date of the range
+        end_date: last date of the range (same as start_date for a single date)
     Return: A dataframe with only data from the specified date range
     """
+    flight_dates = flights_df["flight_date"]
 
-    flights_df["flight_date"] = pd.to_datetime(flights_df["flight_date"])
+    # Binary search for the rows from the start of start_date up to (not including) the day after end_date
+    start = pd.Timestamp(start_date, tz=flight_dates.dt.tz)
+    end = pd.Timestamp(end_date, tz=flight_dates.dt.tz) + pd.Timedelta(days=1)
+    start_idx, end_idx = flight_dates.searchsorted([start, end])
 
-    # If single dates are selected
-    if start_date == end_date:
-        filtered_df = flights_df[flights_df["flight_date"].dt.date == start_date]
+    return flights_df.iloc[start_idx:end_idx]
+
+def filter_predicates(airline: str = None, status: str = None, exclude_status: tuple = (), include: dict = None, exclude: dict = None):
+    """ 
+    Normalize the filters accepted by QueryContext.select into a hashable tuple of (column, values, exclude) predicates
+    """
+    predicates = []
+    if airline is not None:
+        predicates.append(("airline", (airline,), False))
+    if status is not None:
+        predicates.append(("flight_status", (status,), False))
+    if exclude_status:
+        predicates.append(("flight_status", tuple(exclude_status), True))
+    predicates += [(column, tuple(values), False) for column, values in (include or {}).items()]
+    predicates += [(column, tuple(values), True) for column, values in (exclude or {}).items()]
+
+    return tuple(predicates)
+
+class QueryContext:
+    """ 
+    Filters over one render's dashboard frame. Each distinct predicate (e.g. airline == "Delta Air Lines") is evaluated once 
+    and each distinct filter combination is selected once, then shared by every chart in the render.
+    Parameter:
+        flights_df: date-filtered flights dataframe or cube
+    """
+
+    def __init__(self, flights_df: pd.DataFrame):
+        self.flights_df = flights_df
+        self._masks = {}
+        self._frames = {}
+
+    def mask(self, column: str, values: tuple, exclude: bool = False):
+        """ 
+        Boolean mask for rows whose column value is (or with exclude=True, is not) one of values
+        """
+        key = (column, values, exclude)
+        if key not in self._masks:
+            mask = self.flights_df[column].isin(values).to_numpy()
+            self._masks[key] = ~mask if exclude else mask
+        return self._masks[key]
+
+    def select(self, airline: str = None, status: str = None, exclude_status: tuple = (), include: dict = None, exclude: dict = None):
+        """ 
+        Rows for an airline and/or flight status, excluding the statuses in exclude_status
+        Parameters:
+            airline: airline to filter for (all airlines if None)
+            status: flight status to filter for (all statuses if None)
+            exclude_status: flight statuses to leave out, e.g. EXCLUDED_STATUS
+            include: other columns to filter on, e.g. {"arr_country": ("US",)}
+            exclude: other columns to filter out, e.g. {"arr_country": ("US",)}
+        Return:
+            Shallow copy of the shared filtered frame, so charts can add their own columns
+        """
+        predicates = filter_predicates(airline, status, exclude_status, include, exclude)
+        if predicates not in self._frames:
+            mask = np.ones(len(self.flights_df), dtype=bool)
+            for column, values, excluded in predicates:
+                mask &= self.mask(column, values, exclude=excluded)
+            self._frames[predicates] = self.flights_df[mask]
+
+        return self._frames[predicates].copy(deep=False)
+
+    def aggregate(self, groupby: list, **filters):
+        """ 
+        Sum the cube measures (CUBE_MEASURES) by the groupby columns for the rows matching filters (see select)
+        Return:
+            Dataframe with the groupby columns and the summed measures, sorted by the groupby columns
+        """
+        return self.select(**filters).groupby(groupby, observed=True)[CUBE_MEASURES].sum().reset_index()
+
+@st.cache_resource
+def get_duckdb_connection():
+    """ 
+    In-memory DuckDB database shared by all sessions of the dashboard (each query context opens its own cursor)
+    """
+    import duckdb
+
+    conn = duckdb.connect()
+    # Keep Parquet footers in memory, since every chart's query scans the same files
+    conn.execute("SET parquet_metadata_cache = true")
+
+    return conn
+
+def duckdb_relation(source: str):
+    """ 
+    SQL for the flights in a CSV file or Parquet dataset, with the cube dimensions (hour and delay_bin derived) and dep_delay
+    Parameter:
+        source: path of the CSV file or Parquet dataset directory
+    Return: SQL select statement
+    """
+    import os
+
+    path = source.replace("'", "''")
+    if os.path.isdir(source):
+        scan = f"read_parquet('{os.path.join(path, '**', '*.parquet')}', hive_partitioning = true)"
+    elif source.endswith(".parquet"):
+        scan = f"read_parquet('{path}')"
     else:
-        filtered_df = flights_df[
-            (flights_df["flight_date"].dt.date >= start_date) & 
-            (flights_df["flight_date"].dt.date <= end_date)]
+        scan = f"read_csv('{path}')"
 
-    return filtered_df
+    # Same right-closed bins as pd.cut in build_cube
+    delay_bin = " ".join(f"WHEN dep_delay <= {upper} THEN '{label}'" for upper, label in zip(DELAY_BINS[1:-1], DELAY_LABELS[:-1]))
+
+    return f"""
+        SELECT CAST(flight_date AS DATE) AS flight_date, airline, flight_status, dep_iata, dep_airport, arr_iata, arr_airport, 
+            arr_country, arr_latitude, arr_longitude, CAST(hour(scheduled_departure_datetime) AS INTEGER) AS hour, 
+            CASE WHEN dep_delay IS NULL THEN NULL {delay_bin} ELSE '{DELAY_LABELS[-1]}' END AS delay_bin, dep_delay
+        FROM {scan}
+    """
 
-def cancelled_flights(flights_df: pd.DataFrame, airline: str):
+@st.cache_resource(show_spinner="Importing flight data...")
+def import_duckdb_table(source: str, source_mtime: float):
+    """ 
+    Import a CSV source into a table of the shared DuckDB database, so it is parsed once rather than on every query. 
+    Cached by Streamlit per source and modified time.
+    Parameters:
+        source: path of the CSV file
+        source_mtime: modified time of the source, used to invalidate the cache
+    Return: table name
+    """
+    import hashlib
+
+    table_name = "flights_" + hashlib.md5(source.encode()).hexdigest()[:12]
+    conn = get_duckdb_connection().cursor()
+    conn.execute("SET TimeZone = 'UTC'")
+    conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS {duckdb_relation(source)} ORDER BY flight_date")
+
+    return table_name
+
+class DuckDBQueryContext:
+    """ 
+    Same aggregate() interface as QueryContext, but each aggregation runs as a multithreaded DuckDB query over the CSV file 
+    or Parquet dataset, so only the small result set is loaded into pandas. The date range and filters are pushed down to the 
+    scan, which skips Parquet partitions (flight_date, dep_iata) that cannot match.
+    Parameters:
+        source: path of the CSV file or Parquet dataset directory
+        start_date: first date of the range (optional)
+        end_date: last date of the range (optional)
+    """
+
+    def __init__(self, source: str, start_date=None, end_date=None):
+        self.source = source
+        self.start_date = start_date
+        self.end_date = end_date
+        self.conn = get_duckdb_connection().cursor()
+        # Date and hour are taken in UTC, as in the pandas loader
+        self.conn.execute("SET TimeZone = 'UTC'")
+
+    def relation(self):
+        """ 
+        SQL for the flights in the source: Parquet is scanned directly (with pushdown), CSV is read from its imported table
+        """
+        import os
+
+        if os.path.isdir(self.source) or self.source.endswith(".parquet"):
+            return duckdb_relation(self.source)
+        return f"SELECT * FROM {import_duckdb_table(self.source, get_source_mtime(self.source))}"
+
+    def date_bounds(self):
+        """ 
+        First and last flight date in the source
+        """
+        return self.conn.execute(f"SELECT min(flight_date), max(flight_date) FROM ({self.relation()})").fetchone()
+
+    def aggregate(self, groupby: list, **filters):
+        """ 
+        Sum the cube measures (CUBE_MEASURES) by the groupby columns for the rows matching filters (see QueryContext.select)
+        Return:
+            Dataframe with the groupby columns and the summed measures, sorted by the groupby columns
+        """
+        clauses, params = [], []
+        if self.start_date is not None:
+            clauses.append("flight_date BETWEEN ? AND ?")
+            params += [self.start_date, self.end_date]
+
+        for column, values, excluded in filter_predicates(**filters):
+            placeholders = ", ".join("?" * len(values))
+            if excluded:
+                # Keep missing values, as pandas' ~isin does
+                clauses.append(f'("{column}" IS NULL OR "{column}" NOT IN ({placeholders}))')
+            else:
+                clauses.append(f'"{column}" IN ({placeholders})')
+            params += list(values)
+
+        # Missing keys are dropped, as in a pandas groupby
+        clauses += [f'"{column}" IS NOT NULL' for column in groupby]
+
+        columns = ", ".join(f'"{column}"' for column in groupby)
+        query = f"""
+            SELECT {columns},
+                count(*) AS flight_count,
+                coalesce(sum(dep_delay), 0) AS dep_delay_sum,
+                count(dep_delay) AS dep_delay_count,
+                count(*) FILTER (WHERE dep_delay < 15) AS ontime_count,
+                count(*) FILTER (WHERE dep_delay > 15) AS delayed_15_count,
+                count(*) FILTER (WHERE dep_delay > 60) AS delayed_60_count
+            FROM ({self.relation()})
+            WHERE {" AND ".join(clauses) or "true"}
+            GROUP BY {columns}
+            ORDER BY {columns}
+        """
+        return self.conn.execute(query, params).df()
+
+def cancelled_flights(ctx: QueryContext, airline: str):
     
     """ 
     Determine whether any particular departure location were more prone to cancellation
     Parameter:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         airline: name of airline for filtering
     Return:
         Aggregate dataframe containing 
     """
     # Filter for cancelled flights and airline 
-    cancelled_flights = flights_df[(flights_df["flight_status"] == "cancelled") & (flights_df["airline"] == airline)]
-    
-    agg_df = (cancelled_flights.groupby(["dep_iata", "dep_airport"])["flight_date"]
-            .count()
-            .reset_index(name='flight_count')
+    agg_df = (ctx.aggregate(["dep_iata", "dep_airport"], airline=airline, status="cancelled")
+            [["dep_iata", "dep_airport", "flight_count"]]
             .sort_values(by="flight_count", ascending = False)
     )
 
@@ -62,27 +417,22 @@ def cancelled_flights(flights_df: pd.DataFrame, airline: str):
     
     return fig
 
-def aggregate_delay_metric(flights_df: pd.DataFrame, groupby_col: list, arr_iata: str = None):
+def aggregate_delay_metric(ctx: QueryContext, groupby_col: list, arr_iata: str = None):
 
     """ 
     Output the fraction of delays for each departure airport for certain destinations, if specified.
     Parameters:
-        flights_df: flights data
+        ctx: QueryContext over the date-filtered cube
         groupby_col: column(s) to groupby e.g. dep_airport, airline, etc.
         arr_iata: IATA code for the arrival airport (optional)
     Returns:
         An aggregated DataFrame showing % on-time and % delay.
     """
-    flights_copy = flights_df[(flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
-    if arr_iata:
-        flights_copy = flights_copy[flights_copy["arr_iata"].isin(arr_iata)]
-    
-    flights_copy["on_time"] = (flights_copy["dep_delay"] < 15).astype(int)
-    agg_df = flights_copy.groupby(groupby_col).agg(
-        ontime_count=("on_time", "sum"),
-        total_flights=("airline", "count")
-    ).reset_index()
+    include = {"arr_iata": arr_iata} if arr_iata else None
+    agg_df = (ctx.aggregate(groupby_col, exclude_status=EXCLUDED_STATUS, include=include)
+              [groupby_col + ["ontime_count", "flight_count"]]
+              .rename(columns={"flight_count": "total_flights"})
+    )
 
     agg_df["pct_ontime"] = (agg_df["ontime_count"] / agg_df["total_flights"]) * 100
     agg_df["pct_delay"] = 100 - agg_df["pct_ontime"]
@@ -127,12 +477,12 @@ def plot_delay_metric(agg_df, x: str, y: str, x_title: str, y_title: str, plot_t
     return fig
 
 
-def delays_heatmap(flights_df: pd.DataFrame, var: str, var_name: str, airline: str):
+def delays_heatmap(ctx: QueryContext, var: str, var_name: str, airline: str):
 
     """ 
     Delay comparison between different variables such as airline or day of week  
     Parameter:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         var: categorical variable to use for comparison to delay_bin
         var_name: variable name to use for y axis labeling
         airline: filter by the airline 
@@ -140,18 +490,11 @@ def delays_heatmap(flights_df: pd.DataFrame, var: str, var_name: str, airline: s
        Heatmap visualizing how flight proportions for a selected variable, i.e. departure airport, are distributed across delay bins.
     """
 
-    # Filter airline
-    flights_copy = flights_df[(flights_df["airline"] == airline) & (flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
-    # Define delay bins and labels
-    bins = [-float("inf"), 0, 15, 30, 60, 120, float("inf")]
-    labels = ["Early/On time", "0–15 min", "15–30 min", "30–60 min", "1–2 hrs", "2+ hrs"]
-
-    # Categorize delay times
-    flights_copy["delay_bin"] = pd.cut(flights_copy["dep_delay"], bins=bins, labels=labels, right=True)
-
-    # Count and normalize
-    delay_counts = flights_copy.groupby([var, "delay_bin"], observed=False).size().unstack(fill_value=0)
+    # Count and normalize (only airports flown by the airline, but every delay bin)
+    delay_counts = (ctx.aggregate([var, "delay_bin"], airline=airline, exclude_status=EXCLUDED_STATUS)
+                    .set_index([var, "delay_bin"])["flight_count"]
+                    .unstack(fill_value=0)
+                    .reindex(columns=DELAY_LABELS, fill_value=0))
     airline_delay_proportions = delay_counts.div(delay_counts.sum(axis=1), axis=0)
 
     fig = None
@@ -184,30 +527,26 @@ def delays_heatmap(flights_df: pd.DataFrame, var: str, var_name: str, airline: s
     return fig
     
 
-def relative_delay(flights_df: pd.DataFrame, airline: str):
+def relative_delay(ctx: QueryContext, airline: str):
 
     """ 
     Compare the relative mean delay per airport where > 1 for airport has more delay than average and < 1 airport has less delay than average
     Parameters:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         airline: filter by airline 
         plot: plots the heatmap if True, otherwise False (default)
     Returns:
         Heatmap comparing the relative delays for each airport
     """
 
-    # Filter by airline
-    flights_copy = flights_df[(flights_df["airline"] == airline) & (flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
     # Calculate global mean delay
-    global_mean = flights_copy["dep_delay"].mean()
+    airline_totals = ctx.aggregate(["airline"], airline=airline, exclude_status=EXCLUDED_STATUS)
+    global_mean = airline_totals["dep_delay_sum"].sum() / airline_totals["dep_delay_count"].sum()
 
     # Mean delay by airport
-    mean_delay_by_airport = (
-        flights_copy.groupby("dep_airport")["dep_delay"]
-        .mean()
-        .reset_index(name="mean_delay")
-    )
+    mean_delay_by_airport = ctx.aggregate(["dep_airport"], airline=airline, exclude_status=EXCLUDED_STATUS)
+    mean_delay_by_airport["mean_delay"] = (mean_delay_by_airport["dep_delay_sum"] / 
+                                           mean_delay_by_airport["dep_delay_count"].where(mean_delay_by_airport["dep_delay_count"] > 0))
 
     # Calculate ratio to global mean
     mean_delay_by_airport["delay_ratio"] = mean_delay_by_airport["mean_delay"] / global_mean
@@ -239,34 +578,29 @@ def relative_delay(flights_df: pd.DataFrame, airline: str):
     return fig
 
 
-def top_delayed_routes(flights_df: pd.DataFrame, airline: str, domestic: bool = True):
+def top_delayed_routes(ctx: QueryContext, airline: str, domestic: bool = True):
     """ 
     Find the top delayed routes (delay > 60 mins) for routes with flight counts greater than the median of all destinations
     Parameter:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         airline: filter by airline 
         domestic: set value to True (default) to view domestic flights only (US), otherwise False for international flights
     Returns:
         DataFrame containing dep_iata/airport, arr_iata/airport, and delay_rate for a specified departure location, 
         or for all departures if none is specified
     """
-    # Filter by airline 
-    flights_copy = flights_df[(flights_df["airline"] == airline) & (flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
-    # Filter by domestic or international flights
-    flights_copy = flights_copy[
-        flights_copy["arr_country"] == "US" if domestic else flights_copy["arr_country"] != "US"
-    ].copy()
+    # Filter by airline and by domestic or international flights
+    country = {"arr_country": ("US",)}
+    routes = ["dep_iata", "dep_airport", "arr_iata", "arr_airport"]
+    route_df = ctx.aggregate(routes, airline=airline, exclude_status=EXCLUDED_STATUS, 
+                             include=country if domestic else None, exclude=None if domestic else country)
 
     # Compute the delay_rate
-    flights_copy["is_delayed"] = (flights_copy["dep_delay"] > 60).astype(int)
     route_df = (
-        flights_copy
-        .groupby(["dep_iata", "dep_airport", "arr_iata", "arr_airport"])
-        .agg(
-            flight_count=("flight_date", "count"),
-            delay_count=("is_delayed", "sum")
-        )
+        route_df
+        .set_index(routes)
+        [["flight_count", "delayed_60_count"]]
+        .rename(columns={"delayed_60_count": "delay_count"})
         .assign(delay_rate=lambda x: x["delay_count"] / x["flight_count"])
     )
     # Compute the median flight count
@@ -283,19 +617,11 @@ def top_delayed_routes(flights_df: pd.DataFrame, airline: str, domestic: bool =
     
     return top10
 
-def extract_hour(flights_df):
-
-    flights_copy = flights_df.copy()
-    flights_copy["scheduled_departure_datetime"] = pd.to_datetime(flights_copy["scheduled_departure_datetime"], errors="coerce")       
-    flights_copy["hour"] = flights_copy["scheduled_departure_datetime"].dt.hour
-    
-    return flights_copy
-
-def peak_hour_delays(flights_df, airline: str):
+def peak_hour_delays(ctx: QueryContext, airline: str):
     """ 
     Output delayed flight counts for each hour and overlay total flight counts.
     Parameter:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         airline: filter by airline 
     Return:
         Plotly figure showing the number of delayed flights by hour as a bar chart, with a line plot overlay representing the total flight count per hour. 
@@ -303,24 +629,23 @@ def peak_hour_delays(flights_df, airline: str):
 
     import plotly.graph_objects as go
 
-    flights_copy = flights_df[(flights_df["airline"] == airline) & (flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
-    # Create Domestic/International group
-    flights_copy["country_group"] = np.where(flights_copy["arr_country"] == "US", "Domestic", "International")
-
-    # Count delayed flights (> 15 min) by hour and flight type
-    delayed_flights = flights_copy[flights_copy["dep_delay"] > 15]
+    # Count delayed flights (> 15 min) by hour and flight type (Domestic = US arrivals)
+    country = {"arr_country": ("US",)}
+    domestic = ctx.aggregate(["hour"], airline=airline, exclude_status=EXCLUDED_STATUS, include=country)
+    international = ctx.aggregate(["hour"], airline=airline, exclude_status=EXCLUDED_STATUS, exclude=country)
     grouped_counts = (
-        delayed_flights.groupby(["hour", "country_group"])
-        .size()
-        .reset_index(name="delayed_flight_count")
+        pd.concat([domestic.assign(country_group="Domestic"), international.assign(country_group="International")])
+        .query("delayed_15_count > 0")
+        .sort_values(["hour", "country_group"], ignore_index=True)
+        [["hour", "country_group", "delayed_15_count"]]
+        .rename(columns={"delayed_15_count": "delayed_flight_count"})
     )
 
     # Count total flights by hour (for line plot)
     total_flights_by_hour = (
-        flights_copy.groupby(["hour"])
-        .size()
-        .reset_index(name="total_flight_count")
+        ctx.aggregate(["hour"], airline=airline, exclude_status=EXCLUDED_STATUS)
+        [["hour", "flight_count"]]
+        .rename(columns={"flight_count": "total_flight_count"})
     )
 
     # Enforcing same range axes
@@ -397,32 +722,67 @@ def country_to_continent(country_name: pd.DataFrame):
         return continent_name.lower()
     except:
         return "other"
+
+@st.cache_data
+def load_country_regions(airports_csv: str = AIRPORTS_CSV):
+    """ 
+    Build a country -> region table for every country code in the airports reference file
+    Parameter:
+        airports_csv: path to the airports CSV with a 'country' column
+    Return:
+        Dictionary mapping each country code to its region (see country_to_continent)
+    """
+    import os
+
+    if not os.path.exists(airports_csv):
+        return {}
+
+    # keep_default_na=False so Namibia ("NA") is not read as missing
+    countries = pd.read_csv(airports_csv, usecols=["country"], keep_default_na=False)["country"].unique()
+    return {country: country_to_continent(country) for country in countries if country}
+
+def map_regions(countries: pd.Series):
+    """ 
+    Assign a region to each country, looking up each distinct country once
+    Parameter:
+        countries: Series of country codes
+    Return:
+        Series of regions aligned with countries; missing countries are assigned 'other'
+    """
+    region_table = load_country_regions()
+    lookup = {country: region_table[country] if country in region_table else country_to_continent(country) 
+              for country in countries.dropna().unique()}
+
+    regions = countries.map(lookup)
+    if regions.hasnans:
+        regions = regions.astype(object).fillna("other")
+
+    return regions
     
-def flight_volume_by_day(flights_df:pd.DataFrame, airline:str, region: str):
+def flight_volume_by_day(ctx: QueryContext, airline:str, region: str):
     """ 
     Plots the total flights for each day of the week
     Parameters:
-        flights_df: DataFrame containing flight data with 'departure_day_of_week' column. 
+        ctx: QueryContext over the date-filtered cube
         airline: airline to filter for
         region: continent to filter for (lowercase string)
     Returns:
         Plotly figure showing flight counts by day of the week.
     """
-    flights_copy = flights_df.copy()
-
-    flights_copy = flights_copy[(flights_copy["airline"] == airline) & (flights_copy["flight_status"] != "cancelled") & (flights_copy["flight_status"] != "diverted")].copy()
-
-    # Create a new column, "region", that assigns the correct continent to the country
-    flights_copy["region"] = flights_copy["arr_country"].apply(country_to_continent)
+    if region == "world":
+        flights_copy = ctx.aggregate(["flight_date"], airline=airline, exclude_status=EXCLUDED_STATUS)
+    else:
+        flights_copy = ctx.aggregate(["flight_date", "arr_country"], airline=airline, exclude_status=EXCLUDED_STATUS)
 
-    if region != "world":
-        flights_copy = flights_copy[flights_copy["region"] == region].copy()
+        # Create a new column, "region", that assigns the correct continent to the country
+        flights_copy["region"] = map_regions(flights_copy["arr_country"])
+        flights_copy = flights_copy[flights_copy["region"] == region]
 
-    flights_copy["departure_day_of_week"] = flights_copy["flight_date"].dt.day_name()
+    flights_copy["departure_day_of_week"] = pd.to_datetime(flights_copy["flight_date"]).dt.day_name()
 
     grouped_df = (
-        flights_copy.groupby("departure_day_of_week")
-        .size()
+        flights_copy.groupby("departure_day_of_week")["flight_count"]
+        .sum()
         .reset_index(name="flights_count")
     )
     
@@ -449,26 +809,20 @@ def flight_volume_by_day(flights_df:pd.DataFrame, airline:str, region: str):
     return fig
 
 
-def map(flights_df: pd.DataFrame, airline: str, scope: str):
+def map(ctx: QueryContext, airline: str, scope: str):
     """ 
     Show the distribution of arrival cities on a map 
     Parameters:
-        flights_df: flights dataframe
+        ctx: QueryContext over the date-filtered cube
         airline: Filter by an airline
         scope: geographical region to display on the map i.e. "usa", "world"
     Return:
         Plotly scatter_geo map figure
     """
 
-    filtered_df = flights_df[(flights_df["airline"] == airline) & (flights_df["flight_status"] != "cancelled") & (flights_df["flight_status"] != "diverted")].copy()
-
     # Group by location and airport name
-    agg_df = filtered_df.groupby(
-        ['arr_latitude', 'arr_longitude', 'arr_airport']
-    ).agg(
-        dep_delay=('dep_delay', 'mean'),
-        flight_count=('arr_iata', 'size')
-    ).reset_index()
+    agg_df = ctx.aggregate(['arr_latitude', 'arr_longitude', 'arr_airport'], airline=airline, exclude_status=EXCLUDED_STATUS)
+    agg_df["dep_delay"] = agg_df["dep_delay_sum"] / agg_df["dep_delay_count"].where(agg_df["dep_delay_count"] > 0)
 
     fig = px.scatter_geo(
         agg_df,
@@ -504,20 +858,120 @@ def map(flights_df: pd.DataFrame, airline: str, scope: str):
 
     return fig
 
+def record_timing(name: str, start: float):
+    """ 
+    Store the seconds elapsed since start under name in the session's render timings (shown in the debug panel)
+    Parameters:
+        name: timing label e.g. "time to first chart"
+        start: time.perf_counter() value when the timed step started
+    """
+    st.session_state.setdefault("render_timings", {})[name] = round(time.perf_counter() - start, 3)
+
+def delays_section(ctx: QueryContext, render_start: float):
+    """ 
+    First section: on-time rate by airline, relative delay by airport and delay rate by departure airport
+    Parameters:
+        ctx: QueryContext over the date-filtered cube
+        render_start: time.perf_counter() value when the script run started, to time the first chart
+    """
+    section_start = time.perf_counter()
+
+    with st.container():
+        st.subheader("Delays", help="Unless specified, flights are considered delayed if delay time exceeds 15 minutes")
+        col1, col2, col3 = st.columns([0.5,1,1])
+        with col1: 
+            agg_delays_by_airline = aggregate_delay_metric(ctx, ["airline"])
+            st.plotly_chart(plot_delay_metric(agg_df=agg_delays_by_airline, x="airline", y="pct_ontime", 
+                                                x_title="Airline", y_title="% On Time", plot_title="On Time Rate for Major US Airlines"))
+            record_timing("time to first chart", render_start)
+        with col2: 
+            relative_delay_heatmap = relative_delay(ctx, "Delta Air Lines")
+            st.plotly_chart(relative_delay_heatmap, use_container_width=True, key="relative_delay_chart")
+        with col3:
+            agg_delays_by_iata_airline = aggregate_delay_metric(ctx, ["dep_iata", "airline"])
+            st.plotly_chart(plot_delay_metric(agg_df=agg_delays_by_iata_airline, x="dep_iata", y="pct_delay", x_title="Departure IATA Code",
+                                                y_title="% Delays", plot_title="Delay Rate by Departure Airport and Airline", color_by="airline"))
+
+    record_timing("delays section", section_start)
+
+def distribution_section(ctx: QueryContext):
+    """ 
+    Second section: delay bins by departure airport, delays by hour and cancellations by departure airport
+    Parameter:
+        ctx: QueryContext over the date-filtered cube
+    """
+    section_start = time.perf_counter()
+
+    with st.container():    
+        col1, col2, col3 = st.columns([1, 1, 0.8])  
+        with col1:
+            st.plotly_chart(delays_heatmap(ctx, "dep_iata", "Departure Airport", "Delta Air Lines"))
+        with col2:
+            st.plotly_chart(peak_hour_delays(ctx, "Delta Air Lines"))
+        with col3:
+            st.plotly_chart(cancelled_flights(ctx, "Delta Air Lines"))
+
+    record_timing("distribution section", section_start)
+
+def routes_section(ctx: QueryContext):
+    """ 
+    Third section: top delayed routes table
+    Parameter:
+        ctx: QueryContext over the date-filtered cube
+    """
+    section_start = time.perf_counter()
+
+    with st.container():
+        col1, = st.columns(1)
+        with col1:
+            st.markdown("#### Top Delayed Routes (Delays > 60 min)", 
+                        help="Top delayed routes are defined as those with delay times exceeding 60 minutes. " \
+                        "The delay rate represents the proportion of flights delayed on each route and is used to rank routes with the highest delays. " \
+                        "To reduce bias from routes with very few flights, only routes with a flight count above the overall median are included.")
+            st.dataframe(top_delayed_routes(ctx, "Delta Air Lines"))
+
+    record_timing("routes section", section_start)
+
+@st.fragment
+def arrivals_section(ctx: QueryContext):
+    """ 
+    Fourth section: flights by day of week and arrival map for the selected region. Runs as a fragment, so changing 
+    the region re-runs only this section.
+    Parameter:
+        ctx: QueryContext over the date-filtered cube
+    """
+    section_start = time.perf_counter()
+
+    with st.container():
+        st.subheader("Flight Arrival Distribution")
+        col1, col2 = st.columns([0.6, 1.5])
+        with col1:
+            scope = ["world", "asia", "africa", "europe", "north america", "south america", "usa"]
+            selected_option = st.selectbox("Choose region:", scope, width=200)
+            st.plotly_chart(flight_volume_by_day(ctx, "Delta Air Lines", selected_option))
+        with col2:
+            map_flight_distribution = map(ctx, "Delta Air Lines", selected_option)
+            st.plotly_chart(map_flight_distribution, use_container_width=True, key = "world_map_chart")
+
+    record_timing("arrivals section", section_start)
+
 def main():
 
-    df = load_data()
+    render_start = time.perf_counter()
+
+    if QUERY_ENGINE == "duckdb":
+        min_date, max_date = DuckDBQueryContext(DATA_SOURCE).date_bounds()
+    else:
+        df = load_cube()
+        min_date = df["flight_date"].min().date()
+        max_date = df["flight_date"].max().date()
 
     # Sidebar
     with st.sidebar:
         st.title("Delta Air Lines Monthly Performance Dashboard")
         st.header("Settings")
 
-        df["flight_date"] = pd.to_datetime(df["flight_date"])
-
         # Date range selector in sidebar
-        min_date = df["flight_date"].dt.date.min()
-        max_date = df["flight_date"].dt.date.max()  
 
         date_range = st.date_input("Select a date range:", (min_date, max_date), min_value = min_date, max_value = max_date,
                                    help="Select a single date or date range to filter the data")
@@ -531,7 +985,10 @@ def main():
             start_date = end_date = date_range
     
     # Filter data by selected start/end date
-    filtered_df = select_date(df, start_date, end_date)
+    if QUERY_ENGINE == "duckdb":
+        ctx = DuckDBQueryContext(DATA_SOURCE, start_date, end_date)
+    else:
+        ctx = QueryContext(select_date(df, start_date, end_date))
 
     # Display date range information
     if start_date == end_date:
@@ -542,63 +999,27 @@ def main():
     # Generate metrics for columns 
     with st.container():
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Flights", value = len(filtered_df[filtered_df["airline"] == "Delta Air Lines"]))
-        col2.metric("Cancelled Flights", value=len(filtered_df[(filtered_df["flight_status"] == "cancelled") & 
-                                                              (filtered_df["airline"] == "Delta Air Lines")]))
-        col3.metric("Diverted Flights", value=len(filtered_df[(filtered_df["flight_status"] == "diverted") & 
-                                                            (filtered_df["airline"] == "Delta Air Lines")]))
+        total_flights = ctx.aggregate(["airline"], airline="Delta Air Lines")["flight_count"].sum()
+        status_counts = ctx.aggregate(["flight_status"], airline="Delta Air Lines").set_index("flight_status")["flight_count"]
+        col1.metric("Total Flights", value=total_flights)
+        col2.metric("Cancelled Flights", value=status_counts.get("cancelled", 0))
+        col3.metric("Diverted Flights", value=status_counts.get("diverted", 0))
+    record_timing("metrics", render_start)
     
     st.markdown("---")
 
     # Chart Section
-    ## First section 
-    with st.container():
-        st.subheader("Delays", help="Unless specified, flights are considered delayed if delay time exceeds 15 minutes")
-        col1, col2, col3 = st.columns([0.5,1,1])
-        with col1: 
-            agg_delays_by_airline = aggregate_delay_metric(filtered_df, ["airline"])
-            st.plotly_chart(plot_delay_metric(agg_df=agg_delays_by_airline, x="airline", y="pct_ontime", 
-                                                x_title="Airline", y_title="% On Time", plot_title="On Time Rate for Major US Airlines"))
-        with col2: 
-            relative_delay_heatmap = relative_delay(filtered_df, "Delta Air Lines")
-            st.plotly_chart(relative_delay_heatmap, use_container_width=True, key="relative_delay_chart")
-        with col3:
-            agg_delays_by_iata_airline = aggregate_delay_metric(filtered_df, ["dep_iata", "airline"])
-            st.plotly_chart(plot_delay_metric(agg_df=agg_delays_by_iata_airline, x="dep_iata", y="pct_delay", x_title="Departure IATA Code",
-                                                y_title="% Delays", plot_title="Delay Rate by Departure Airport and Airline", color_by="airline"))
-            
-    ## Second section           
-    with st.container():    
-        col1, col2, col3 = st.columns([1, 1, 0.8])  
-        with col1:
-            st.plotly_chart(delays_heatmap(filtered_df, "dep_iata", "Departure Airport", "Delta Air Lines"))
-        with col2:
-            filtered_df = extract_hour(filtered_df)
-            st.plotly_chart(peak_hour_delays(filtered_df, "Delta Air Lines"))
-        with col3:
-            st.plotly_chart(cancelled_flights(filtered_df, "Delta Air Lines"))
+    delays_section(ctx, render_start)
+    distribution_section(ctx)
+    routes_section(ctx)
+    arrivals_section(ctx)
 
-    ## Third section
-    with st.container():
-        col1, = st.columns(1)
-        with col1:
-            st.markdown("#### Top Delayed Routes (Delays > 60 min)", 
-                        help="Top delayed routes are defined as those with delay times exceeding 60 minutes. " \
-                        "The delay rate represents the proportion of flights delayed on each route and is used to rank routes with the highest delays. " \
-                        "To reduce bias from routes with very few flights, only routes with a flight count above the overall median are included.")
-            st.dataframe(top_delayed_routes(filtered_df, "Delta Air Lines"))
+    record_timing("full render", render_start)
 
-    ## Fourth section
-    with st.container():
-        st.subheader("Flight Arrival Distribution")
-        col1, col2 = st.columns([0.6, 1.5])
-        with col1:
-            scope = ["world", "asia", "africa", "europe", "north america", "south america", "usa"]
-            selected_option = st.selectbox("Choose region:", scope, width=200)
-            st.plotly_chart(flight_volume_by_day(filtered_df, "Delta Air Lines", selected_option))
-        with col2:
-            map_flight_distribution = map(filtered_df, "Delta Air Lines", selected_option)
-            st.plotly_chart(map_flight_distribution, use_container_width=True, key = "world_map_chart")
+    # Debug panel, shown when the app is opened with ?debug=1
+    if st.query_params.get("debug"):
+        with st.sidebar.expander("Render timings (seconds)", expanded=True):
+            st.dataframe(pd.Series(st.session_state["render_timings"], name="seconds"))
 
         
 if __name__ == "__main__":
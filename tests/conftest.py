@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+
+import pytest
+
+NOTEBOOK = Path(__file__).resolve().parent.parent / "flights_etl.ipynb"
+
+
+@pytest.fixture(scope="session")
+def etl():
+    """
+    Namespace with the definitions from flights_etl.ipynb (every code cell before the customizable parameters).
+    """
+    notebook = json.loads(NOTEBOOK.read_text())
+    namespace = {}
+
+    for cell in notebook["cells"]:
+        if cell["cell_type"] != "code":
+            continue
+        source = "".join(cell["source"])
+        if source.startswith("### Customizable parameters ###"):
+            break
+        exec(source, namespace)
+
+    return namespace
@@ -0,0 +1,125 @@
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+
+def fake_response(params):
+    response = mock.Mock()
+    if params.get("dep_iata") == "JFK":
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("500 Server Error")
+    else:
+        response.json.return_value = {"pagination": {"total": 1}, "data": [{"flight_date": params["flight_date"]}]}
+    return response
+
+
+def test_get_flights_in_range_returns_none_when_last_job_fails(etl):
+    # The JFK job is submitted last, so it fails while the consumer waits on an empty queue
+    with mock.patch.object(etl["requests"], "get", side_effect=lambda url, params: fake_response(params)):
+        for _ in range(5):
+            flights = etl["get_flights_in_range"]("key", "2025-06-01", "2025-06-01", dep_code_list=["LAX", "JFK"],
+                                                  requests_per_second=1000)
+            assert flights is None
+
+
+def test_concat_flight_pages_matches_parsing_all_records_at_once(etl):
+    records = [
+        {"flight_date": "2025-06-01", "flight": {"number": "1"}, "airline": {"name": "Delta"},
+         "departure": {"iata": "LAX", "delay": 5, "scheduled": "2025-06-01T10:00:00+00:00"}},
+        {"flight_date": "2025-06-01", "flight": None, "airline": {"name": "United"}, "departure": {"iata": "SFO"}},
+        {"flight_date": "2025-06-02", "flight": {"number": "2"}, "airline": {"name": "Delta"}, "arrival": {"iata": "HND"}},
+    ]
+
+    flights_df = etl["concat_flight_pages"]([records[:2], records[2:]])
+
+    etl["pd"].testing.assert_frame_equal(flights_df, etl["parse_flight_response"](records))
+    assert flights_df["airline"].dtype == "category"
+    assert list(flights_df["dep_delay"].isna()) == [False, True, True]
+
+
+def test_journal_resumes_a_failed_pull_and_is_cleared_once_it_completes(etl, tmp_path):
+    journal_path = str(tmp_path / "journal.sqlite")
+    calls = []
+
+    def get(url, params):
+        calls.append(params["dep_iata"])
+        if params["dep_iata"] == "JFK" and calls.count("JFK") == 1:
+            return fake_response(params)
+        return fake_response({**params, "dep_iata": "LAX"})
+
+    def pull():
+        return etl["get_flights_in_range"]("key", "2025-06-01", "2025-06-01", dep_code_list=["LAX", "JFK"],
+                                           requests_per_second=1000, journal_path=journal_path)
+
+    with mock.patch.object(etl["requests"], "get", side_effect=get):
+        assert pull() is None
+        assert len(pull()) == 2
+        # Only the failed JFK page was fetched again on the re-run
+        assert sorted(calls) == ["JFK", "JFK", "LAX"]
+
+        # The completed pull left nothing in the journal, so the next pull fetches fresh pages
+        assert len(pull()) == 2
+        assert calls.count("LAX") == 2
+
+
+def test_enrich_airports_handles_an_all_null_iata_column(etl, tmp_path):
+    # Copy the csv so its Feather cache is written to the temporary directory
+    airports_csv = shutil.copy(Path(__file__).resolve().parent.parent / "airports.csv", tmp_path)
+    flights_df = etl["parse_flight_response"]([{"departure": {"iata": "LAX"}}, {"departure": {"iata": "ZZZ"}}])
+
+    flights_df = etl["enrich_airports"](flights_df, str(airports_csv))
+
+    assert flights_df["dep_city"].iloc[0] == "El Segundo"
+    assert flights_df["dep_city"].iloc[1:].isna().all()
+    assert flights_df["arr_city"].isna().all()
+
+
+def test_impute_delays_skips_a_level_whose_keys_are_all_null(etl):
+    records = [
+        {"flight_date": "2025-06-01", "airline": {"name": "Delta"},
+         "departure": {"iata": "LAX", "delay": 10 if i % 2 else None}, "arrival": {"delay": 10 if i % 2 else None}}
+        for i in range(6)
+    ]
+    flights_df = etl["normalize_datetimes"](etl["parse_flight_response"](records))
+
+    flights_df = etl["impute_delays"](flights_df)
+
+    assert flights_df["dep_delay"].tolist() == [10.0] * 6
+    assert flights_df["arr_delay"].tolist() == [10.0] * 6
+
+
+def test_deduplicator_only_skips_flights_loaded_once_settled(etl, tmp_path):
+    from datetime import date, timedelta
+
+    def flight(number, days_ago, dep_delay=5):
+        return {"flight_date": (date.today() - timedelta(days=days_ago)).isoformat(), "flight": {"number": number},
+                "departure": {"delay": dep_delay}, "arrival": {"delay": 5}}
+
+    records = [flight("1", 10), flight("2", 0), flight("3", 10, dep_delay=None)]
+    path = str(tmp_path / "flight_keys.sqlite")
+
+    first_run = etl["FlightDeduplicator"](path)
+    assert len(first_run.filter(records)) == 3
+    first_run.commit()
+
+    # The recent flight and the flight with an imputed delay are loaded again, so their derived values are refreshed
+    kept = etl["FlightDeduplicator"](path).filter(records)
+    assert [record["flight"]["number"] for record in kept] == ["2", "3"]
+
+
+def test_export_parquet_round_trips_null_partition_values(etl, tmp_path):
+    pd = etl["pd"]
+    flights_df = pd.DataFrame({
+        "flight_date": pd.to_datetime(["2025-06-01"] * 11 + [None], utc=True),
+        "dep_iata": ["LAX"] * 10 + [None, "SFO"],
+        "airline": ["Delta", "United", None] * 4,
+        "dep_delay": [5.0] * 12,
+    })
+
+    etl["export_parquet"](flights_df, str(tmp_path / "flights_parquet"))
+    exported_df = pd.read_parquet(tmp_path / "flights_parquet")
+
+    # The row without a flight_date is left out; the row without dep_iata is kept under UNKNOWN
+    assert len(exported_df) == 11
+    assert exported_df["dep_iata"].astype(str).value_counts().to_dict() == {"LAX": 10, "UNKNOWN": 1}